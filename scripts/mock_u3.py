@@ -0,0 +1,161 @@
+"""Simulated LabJack U3 for testing without hardware.
+
+Mirrors the parts of the ``u3`` module of LabJackPython that are used in
+``stress_test.py``, so that it can be imported in its place::
+
+    import mock_u3 as u3
+
+Each call that talks to the device (writeRegister, setFIOState, getFeedback)
+takes one simulated USB transaction of ``TRANSACTION_TIME`` seconds. As on
+the real device, the commands of one getFeedback call have to fit into
+``MAX_FEEDBACK_DATA`` bytes. Commands
+are executed in the middle of a transaction, that is, after the request
+reached the device and before the response is sent back to the host. Changes
+of the FIO0-7 output pins are logged in ``U3.pin_log`` as (time, state) tuples
+on the ``time.perf_counter`` clock.
+
+As on the real device, writeRegister and setFIOState make the written pins
+digital outputs, whereas the PortStateWrite and BitStateWrite feedback
+commands only change the state of pins that already are digital outputs (see
+PortDirWrite and configIO).
+
+MIT License
+
+Copyright 2021 Stefan Appelhoff, Tristan Stenner
+
+"""
+
+import time
+
+# A full speed USB request and response take about one 1ms frame
+TRANSACTION_TIME = 0.001
+
+# Units of WaitShort and WaitLong on the U3
+WAIT_SHORT_UNIT = 128e-6
+WAIT_LONG_UNIT = 0.032
+
+# Bytes available for the commands in a 64 byte feedback packet
+MAX_FEEDBACK_DATA = 57
+
+# Modbus register holding the FIO state (upper byte: write mask)
+FIO_STATE_REGISTER = 6700
+
+
+class PortStateWrite:
+    """Feedback command setting the FIO, EIO, and CIO states."""
+
+    size = 7
+
+    def __init__(self, State, WriteMask=[0xff, 0xff, 0xff]):
+        self.state = State
+        self.write_mask = WriteMask
+
+
+class PortDirWrite:
+    """Feedback command setting the FIO, EIO, and CIO directions."""
+
+    size = 7
+
+    def __init__(self, Direction, WriteMask=[0xff, 0xff, 0xff]):
+        self.direction = Direction
+        self.write_mask = WriteMask
+
+
+class BitStateWrite:
+    """Feedback command setting the state of a single IO."""
+
+    size = 2
+
+    def __init__(self, IONumber, State):
+        self.io_number = IONumber
+        self.state = State
+
+
+class WaitShort:
+    """Feedback command waiting on the device in units of 128us."""
+
+    size = 2
+    unit = WAIT_SHORT_UNIT
+
+    def __init__(self, Time):
+        if not 0 <= Time <= 255:
+            raise ValueError('Time must be in the range [0, 255].')
+        self.time = Time
+
+
+class WaitLong(WaitShort):
+    """Feedback command waiting on the device in units of 32ms."""
+
+    unit = WAIT_LONG_UNIT
+
+
+class U3:
+    """Simulated U3, only the FIO0-7 outputs are supported."""
+
+    def __init__(self):
+        self.fio = 0
+        # Bits set to 1 are outputs or analog inputs, respectively
+        self.fio_dir = 0
+        self.fio_analog = 0
+        self.pin_log = [(time.perf_counter(), 0)]
+
+    def _set_fio(self, state, mask=0xff):
+        self.fio = (self.fio & ~mask) | (state & mask)
+        outputs = self.fio & self.fio_dir & ~self.fio_analog
+        if outputs != self.pin_log[-1][1]:
+            self.pin_log.append((time.perf_counter(), outputs))
+
+    def _make_output(self, mask):
+        self.fio_dir |= mask
+        self.fio_analog &= ~mask
+
+    def _transaction(self, commands):
+        time.sleep(TRANSACTION_TIME / 2)
+        for command in commands:
+            if isinstance(command, PortDirWrite):
+                mask = command.write_mask[0]
+                self.fio_dir = ((self.fio_dir & ~mask)
+                                | (command.direction[0] & mask))
+                self._set_fio(self.fio, 0)
+            elif isinstance(command, PortStateWrite):
+                self._set_fio(command.state[0], command.write_mask[0])
+            elif isinstance(command, BitStateWrite):
+                if command.io_number > 7:
+                    raise NotImplementedError('Only FIO0-7 are simulated.')
+                bit = 1 << command.io_number
+                self._set_fio(bit if command.state else 0, bit)
+            elif isinstance(command, WaitShort):
+                time.sleep(command.time * command.unit)
+            else:
+                raise NotImplementedError(
+                    'Unsupported command: {}'.format(command))
+        time.sleep(TRANSACTION_TIME / 2)
+
+    def configIO(self, FIOAnalog=None):
+        if FIOAnalog is not None:
+            self.fio_analog = FIOAnalog
+
+    def writeRegister(self, addr, value):
+        if addr != FIO_STATE_REGISTER:
+            raise NotImplementedError('Only register 6700 is simulated.')
+        self._make_output(value >> 8)
+        self._transaction([PortStateWrite([value & 0xff, 0, 0],
+                                          [value >> 8, 0, 0])])
+
+    def setFIOState(self, fioNum, state=1):
+        self._make_output(1 << fioNum)
+        self._transaction([BitStateWrite(fioNum, state)])
+
+    def getFeedback(self, *commandlist):
+        if len(commandlist) == 1 and isinstance(commandlist[0], list):
+            commandlist = commandlist[0]
+        size = sum(command.size for command in commandlist)
+        if size > MAX_FEEDBACK_DATA:
+            raise ValueError('Feedback commands take {} bytes, at most {} '
+                             'bytes fit into a packet.'
+                             .format(size, MAX_FEEDBACK_DATA))
+        self._transaction(commandlist)
+        return [None] * len(commandlist)
+
+    def close(self):
+        pass
@@ -0,0 +1,774 @@
+#!/usr/bin/env python
+"""Find the maximum sustainable trigger rate of a TTL trigger device.
+
+Sends triggers at a ramp of increasing rates and checks for each rate
+whether every trigger produced its own TTL pulse in time.
+
+Usage:
+
+- python stress_test.py emulator
+- python stress_test.py serial --port /dev/ttyACM0
+- python stress_test.py parport
+- python stress_test.py labjack
+
+Run ``python stress_test.py --help`` for all options.
+
+Backends:
+
+- emulator: emulates the firmware used in the study on a pseudo terminal
+  (Linux and OSX only) and logs the state of its output pins
+- serial: a USB trigger device (e.g., Arduino Leonardo, Uno, Teensy 3.2/LC).
+  The device has to write back each received value, see the "Optional: write
+  back the received value" line in the firmware used in the study.
+- parport: the parallel port
+- labjack: a LabJack U3, using the writeRegister method
+- labjack-fio: a LabJack U3, using the setFIOState method. Only drives FIO0,
+  so only the constant pattern can be sent.
+- labjack-feedback: a LabJack U3, sending set-high, wait, and set-low as a
+  single getFeedback command, so that each pulse takes one USB transaction
+
+With ``--mock-u3``, the LabJack backends use the simulated U3 from
+``mock_u3.py`` instead of a real device, for example to compare them:
+
+- python stress_test.py labjack --mock-u3
+- python stress_test.py labjack-fio --mock-u3
+- python stress_test.py labjack-feedback --mock-u3
+
+Pulses are reconstructed from the pin log (emulator, parport, labjack) or from
+the values written back by the device (serial). A trigger counts as:
+
+- dropped, if no pulse with the sent value was observed
+- merged, if its pulse started less than ``--min-gap`` seconds after the
+  previous pulse ended (a recording device would see a single pulse)
+- delayed, if its pulse started more than ``--max-latency`` seconds after the
+  trigger was requested
+
+A rate is sustainable if no triggers were dropped or merged, at most
+``--max-delayed`` of the triggers (but at least one trigger) were delayed,
+and the achieved rate is within 5% of the requested rate. A rate that is not
+sustainable is tested again up to ``--retries`` times before the ramp stops,
+so that a single hiccup of the host does not end the ramp early.
+
+With ``--mode realtime``, triggers are sent from a dedicated thread pinned to
+one CPU with SCHED_FIFO priority and locked memory (Linux only, see
+RealtimeSender). ``--mode both`` runs the ramp in the default and the
+real-time mode and compares their tail latencies (p99 and p99.9). Use a large
+``--n-triggers`` for meaningful tail latencies, for example:
+
+- sudo python stress_test.py parport --mode both --n-triggers 2000
+
+Required packages:
+
+- pyserial (https://pypi.org/project/pyserial/), for the serial backend
+- pyparallel (https://pypi.org/project/pyparallel/), for the parport backend
+- LabJackPython (https://pypi.org/project/LabJackPython/), for the labjack
+  backend
+
+MIT License
+
+Copyright 2021 Stefan Appelhoff, Tristan Stenner
+
+"""
+
+import argparse
+import ctypes
+import csv
+import gc
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+now = time.perf_counter
+
+# The firmware used in the study keeps the pins on for 5ms
+PULSE_WIDTH = 0.005
+
+# GIL switch interval in s, short to let threads take over quickly
+SWITCH_INTERVAL = 5e-5
+
+# Flags for mlockall, see "man mlockall"
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+class Emulator:
+    """Emulate the firmware used in the study on a pseudo terminal.
+
+    The firmware runs in a child process, so that its timing does not depend
+    on the threads of this process. The child appends each change of the
+    output pins to a temporary file, which is read back in ``pin_log``.
+    """
+
+    n_bits = 8
+
+    # One pin change: time (double) and pin state (unsigned char)
+    record = struct.Struct('=dB')
+
+    def __init__(self, args):
+        import tty
+        self.pulse_width = args.pulse_width
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.echo_log = None
+        self._log_file = tempfile.TemporaryFile()
+        self._log_fd = self._log_file.fileno()
+        self._pin_log = [(now(), 0)]
+        self._offset = 0
+        self._exited = False
+        self._pid = os.fork()
+        if self._pid == 0:
+            # Never return into the code of the parent
+            try:
+                self._run_firmware()
+            finally:
+                os._exit(1)
+
+    def _run_firmware(self):
+        os.close(self.slave)
+        gc.disable()
+        while True:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                # Linux raises EIO once the slave side is closed
+                data = b''
+            if not data:
+                os._exit(0)
+            for value in data:
+                # setOutputs, delay, clearOutputs
+                os.write(self._log_fd, self.record.pack(now(), value))
+                time.sleep(self.pulse_width)
+                os.write(self._log_fd, self.record.pack(now(), 0))
+
+    @property
+    def pin_log(self):
+        if os.waitpid(self._pid, os.WNOHANG)[0] != 0:
+            self._exited = True
+            raise RuntimeError('The emulator stopped unexpectedly.')
+        # pread does not move the file offset shared with the child
+        data = os.pread(self._log_fd, 1 << 20, self._offset)
+        n_bytes = len(data) - len(data) % self.record.size
+        self._pin_log.extend(self.record.iter_unpack(data[:n_bytes]))
+        self._offset += n_bytes
+        return self._pin_log
+
+    def send(self, value):
+        os.write(self.slave, bytes([value]))
+
+    def close(self):
+        os.close(self.slave)
+        if not self._exited:
+            os.waitpid(self._pid, 0)
+        os.close(self.master)
+        self._log_file.close()
+
+
+class SerialDevice:
+    """USB trigger device that writes back each received value."""
+
+    n_bits = 8
+
+    def __init__(self, args):
+        import serial
+        self.pulse_width = args.pulse_width
+        self.ser = serial.Serial(port=args.port, baudrate=115200, timeout=0.05)
+        self.pin_log = None
+        self.echo_log = []
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while self._running:
+            line = self.ser.readline().strip()
+            t = now()
+            if not line:
+                continue
+            try:
+                value = int(line)
+            except ValueError:
+                warn('Skipping garbled line from device: {!r}'.format(line))
+                continue
+            self.echo_log.append((t, value))
+
+    def send(self, value):
+        self.ser.write(bytes([value]))
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.ser.close()
+
+
+class ParallelPort:
+    """Parallel port, the pulse is timed on the host."""
+
+    n_bits = 8
+
+    def __init__(self, args):
+        if os.name == 'nt':
+            from psychopy.parallel import ParallelPort as PP
+        else:
+            from parallel import Parallel as PP
+        self.pulse_width = args.pulse_width
+        self.port = PP()
+        self.pin_log = [(now(), 0)]
+        self.echo_log = None
+
+    def send(self, value):
+        self.port.setData(value)
+        self.pin_log.append((now(), value))
+        time.sleep(self.pulse_width)
+        self.port.setData(0)
+        self.pin_log.append((now(), 0))
+
+    def close(self):
+        pass
+
+
+class LabJack:
+    """LabJack U3 using writeRegister, the pulse is timed on the host."""
+
+    n_bits = 8
+
+    def __init__(self, args):
+        if args.mock_u3:
+            import mock_u3 as u3
+        else:
+            import u3
+        self.u3 = u3
+        self.pulse_width = args.pulse_width
+        self.lj = u3.U3()
+        self.echo_log = None
+        # The simulated device logs its pins itself
+        self.mocked = args.mock_u3
+        self.pin_log = self.lj.pin_log if self.mocked else [(now(), 0)]
+
+    def _log(self, t, value):
+        if not self.mocked:
+            self.pin_log.append((t, value))
+
+    def send(self, value):
+        # Upper byte is the write mask for FIO0-7, lower byte the state
+        self.lj.writeRegister(6700, 0xFF00 | value)
+        self._log(now(), value)
+        time.sleep(self.pulse_width)
+        self.lj.writeRegister(6700, 0xFF00)
+        self._log(now(), 0)
+
+    def close(self):
+        self.lj.close()
+
+
+class LabJackFIO(LabJack):
+    """LabJack U3 using setFIOState on FIO0, the pulse is timed on the host."""
+
+    n_bits = 1
+
+    def send(self, value):
+        self.lj.setFIOState(0, 1)
+        self._log(now(), 1)
+        time.sleep(self.pulse_width)
+        self.lj.setFIOState(0, 0)
+        self._log(now(), 0)
+
+
+class LabJackFeedback(LabJack):
+    """LabJack U3 sending the whole pulse in a single feedback command.
+
+    Setting the pins, waiting, and clearing the pins is done on the device,
+    so the pulse takes one USB transaction and no sleep on the host.
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        # Unlike writeRegister and setFIOState, PortStateWrite does not
+        # configure the pins, so make FIO0-7 digital outputs once
+        self.lj.configIO(FIOAnalog=0)
+        self.lj.getFeedback(self.u3.PortDirWrite([0xFF, 0, 0], [0xFF, 0, 0]))
+        # WaitLong waits in units of 32ms (250 units of WaitShort), and
+        # WaitShort waits the rest in units of 128us
+        units = max(1, round(self.pulse_width / 128e-6))
+        long_units, short_units = divmod(units, 250)
+        self.waits = [self.u3.WaitLong(min(long_units - i, 255))
+                      for i in range(0, long_units, 255)]
+        if short_units:
+            self.waits.append(self.u3.WaitShort(short_units))
+        # Two PortStateWrites (7 bytes each) and the waits (2 bytes each)
+        # have to fit into the 57 data bytes of a feedback command
+        if 2 * 7 + 2 * len(self.waits) > 57:
+            raise ValueError('--pulse-width is too long for a single '
+                             'feedback command.')
+        self.wait_time = units * 128e-6
+
+    def send(self, value):
+        self.lj.getFeedback(
+            [self.u3.PortStateWrite([value, 0, 0], [0xFF, 0, 0])]
+            + self.waits
+            + [self.u3.PortStateWrite([0, 0, 0], [0xFF, 0, 0])])
+        # The host only learns when the pulse is over
+        t = now()
+        self._log(t - self.wait_time, value)
+        self._log(t, 0)
+
+
+class RealtimeSender:
+    """Send triggers from a dedicated real-time thread (Linux only).
+
+    The sender thread is pinned to a single CPU and runs with SCHED_FIFO
+    priority, the memory of the process is locked with mlockall, and garbage
+    collection is disabled while the sender is running. Triggers are handed
+    over through a pipe, so the experiment thread never waits for a lock and
+    the sender sleeps in the kernel until a trigger arrives.
+
+    For best results, keep other processes off the CPU, e.g., with the
+    ``isolcpus`` kernel parameter. The other threads of this process are
+    kept off the CPU in ``main``. Setting the priority and locking the
+    memory requires root or the CAP_SYS_NICE and CAP_IPC_LOCK capabilities.
+    """
+
+    def __init__(self, device, cpu, priority):
+        self.device = device
+        self.cpu = cpu
+        self.priority = priority
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self._read, self._write = os.pipe()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        gc.collect()
+        gc.disable()
+        if self.libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+            warn('Could not lock memory: '
+                 + os.strerror(ctypes.get_errno()))
+        self._thread.start()
+        self._ready.wait()
+        if not self._thread.is_alive():
+            self.close()
+            raise RuntimeError('The real-time sender failed to start.')
+
+    def _loop(self):
+        # On Linux, pid 0 refers to the calling thread
+        try:
+            os.sched_setaffinity(0, {self.cpu})
+        except (OSError, ValueError) as err:
+            warn('Could not pin sender to CPU {}: {}'.format(self.cpu, err))
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO,
+                                  os.sched_param(self.priority))
+        except (OSError, ValueError) as err:
+            warn('Could not set SCHED_FIFO priority: {}'.format(err))
+        finally:
+            self._ready.set()
+
+        send = self.device.send
+        while True:
+            data = os.read(self._read, 1)
+            if not data:
+                break
+            send(data[0])
+
+    def send(self, value):
+        os.write(self._write, bytes([value]))
+
+    def close(self):
+        # The sender stops when the pipe is closed
+        os.close(self._write)
+        self._thread.join()
+        os.close(self._read)
+        self.libc.munlockall()
+        gc.enable()
+
+
+BACKENDS = {
+    'emulator': Emulator,
+    'serial': SerialDevice,
+    'parport': ParallelPort,
+    'labjack': LabJack,
+    'labjack-fio': LabJackFIO,
+    'labjack-feedback': LabJackFeedback,
+}
+
+# Byte patterns, mapping the index of a trigger to the value to send
+PATTERNS = {
+    'constant': lambda i: 1,
+    'walking': lambda i: 1 << (i % 8),
+    'counter': lambda i: i % 255 + 1,
+    'random': lambda i: random.randint(1, 255),
+}
+
+
+def read_cpu_list(path):
+    """Return the CPUs of a kernel CPU list such as "0-3,6" in `path`."""
+    cpus = set()
+    with open(path) as fin:
+        for part in fin.read().strip().split(','):
+            if part:
+                first, _, last = part.partition('-')
+                cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def warn(message):
+    """Print a warning to stderr."""
+    print('Warning: ' + message, file=sys.stderr)
+
+
+def wait_until(deadline):
+    """Sleep until shortly before `deadline`, then busy wait."""
+    remaining = deadline - now()
+    if remaining > 0.002:
+        time.sleep(remaining - 0.002)
+    while now() < deadline:
+        # Release the GIL, so that other threads are not held up
+        time.sleep(0)
+
+
+def percentile(values, q):
+    """Return the `q`-th percentile of `values` (linear interpolation)."""
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    pos = (len(values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def get_pulses(device):
+    """Return the observed pulses of `device` as (rise, fall, value)."""
+    if device.pin_log is None:
+        # The device writes back the value after clearing the pins
+        return [(t - device.pulse_width, t, value)
+                for t, value in list(device.echo_log)]
+
+    pulses = []
+    rise = state = 0
+    for t, value in list(device.pin_log):
+        if state and value != state:
+            pulses.append((rise, t, state))
+            state = 0
+        if value and not state:
+            rise, state = t, value
+    return pulses
+
+
+def wait_for_device(device, sends, args):
+    """Wait until `device` has worked through all queued triggers.
+
+    Waits for at least one pulse width per sent trigger, and then until no
+    new pulse was observed for `args.settle` seconds.
+    """
+    backlog_end = sends[0][0] + len(sends) * device.pulse_width
+    time.sleep(max(0, backlog_end - now()))
+    n_pulses = len(get_pulses(device))
+    while True:
+        time.sleep(args.settle)
+        previous, n_pulses = n_pulses, len(get_pulses(device))
+        if n_pulses == previous:
+            break
+
+
+def run_level(send, rate, n_triggers, pattern):
+    """Send `n_triggers` at `rate` Hz and return the (time, value) sent."""
+    interval = 1 / rate
+    sends = []
+    deadline = now()
+    for i in range(n_triggers):
+        value = pattern(i)
+        wait_until(deadline)
+        t_send = now()
+        send(value)
+        sends.append((t_send, value))
+        deadline += interval
+    return sends
+
+
+def analyze(sends, pulses, args):
+    """Match sent triggers to observed pulses.
+
+    Returns a list with one (status, latency) tuple per sent trigger. Status
+    is one of "ok", "delayed", "merged", or "dropped". Latency is None for
+    dropped triggers.
+    """
+    results = []
+    j = 0
+    prev_fall = None
+    for t_send, value in sends:
+        # Allow for a few spurious pulses before giving up on this trigger
+        for k in range(j, min(j + 3, len(pulses))):
+            if pulses[k][2] == value and pulses[k][0] >= t_send:
+                break
+        else:
+            results.append(('dropped', None))
+            continue
+
+        if k > j:
+            prev_fall = pulses[k - 1][1]
+        rise, fall, _ = pulses[k]
+        latency = rise - t_send
+        if prev_fall is not None and rise - prev_fall < args.min_gap:
+            status = 'merged'
+        elif latency > args.max_latency:
+            status = 'delayed'
+        else:
+            status = 'ok'
+        results.append((status, latency))
+        prev_fall = fall
+        j = k + 1
+    return results
+
+
+def summarize(mode, rate, sends, results, args):
+    """Summarize the results of one rate level."""
+    statuses = [status for status, _ in results]
+    latencies = [lat * 1000 for _, lat in results if lat is not None]
+    duration = sends[-1][0] - sends[0][0]
+    achieved = (len(sends) - 1) / duration if duration > 0 else float('inf')
+    summary = {
+        'mode': mode,
+        'rate': rate,
+        'achieved': achieved,
+        'sent': len(sends),
+        'dropped': statuses.count('dropped'),
+        'merged': statuses.count('merged'),
+        'delayed': statuses.count('delayed'),
+        'median': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'p999': percentile(latencies, 99.9),
+        'max': max(latencies, default=float('nan')),
+    }
+    summary['sustainable'] = (
+        summary['dropped'] == 0 and summary['merged'] == 0
+        and summary['delayed'] <= max(1, args.max_delayed * len(sends))
+        and achieved >= 0.95 * rate
+    )
+    return summary
+
+
+def get_rates(args):
+    """Return the geometric ramp of rates to test."""
+    rates = []
+    rate = args.start
+    while rate <= args.stop:
+        rates.append(round(rate, 1))
+        rate *= args.factor
+    return rates
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Find the maximum sustainable trigger rate of a device.')
+    parser.add_argument('backend', choices=sorted(BACKENDS))
+    parser.add_argument('--port', help='port name of the serial device')
+    parser.add_argument('--pattern', choices=sorted(PATTERNS),
+                        help='byte pattern to send (default: walking, or '
+                             'constant for single bit backends)')
+    parser.add_argument('--start', type=float, default=10,
+                        help='first rate in Hz (default: %(default)s)')
+    parser.add_argument('--stop', type=float, default=500,
+                        help='last rate in Hz (default: %(default)s)')
+    parser.add_argument('--factor', type=float, default=1.5,
+                        help='rate increase per level (default: %(default)s)')
+    parser.add_argument('--n-triggers', type=int, default=200,
+                        help='triggers per level (default: %(default)s)')
+    parser.add_argument('--pulse-width', type=float, default=PULSE_WIDTH,
+                        help='pulse width in s (default: %(default)s)')
+    parser.add_argument('--min-gap', type=float, default=0.001,
+                        help='minimum gap between pulses in s, e.g., one '
+                             'sample of the recording device '
+                             '(default: %(default)s)')
+    parser.add_argument('--max-latency', type=float, default=0.002,
+                        help='latency in s above which a trigger is '
+                             'delayed (default: %(default)s)')
+    parser.add_argument('--max-delayed', type=float, default=0.01,
+                        help='tolerated fraction of delayed triggers '
+                             '(default: %(default)s)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='repetitions of a rate that is not sustainable '
+                             '(default: %(default)s)')
+    parser.add_argument('--settle', type=float, default=0.5,
+                        help='time in s without new pulses after which the '
+                             'device is considered idle '
+                             '(default: %(default)s)')
+    parser.add_argument('--csv', help='write per trigger latencies to file')
+    parser.add_argument('--mock-u3', action='store_true',
+                        help='use a simulated U3 for the labjack backends')
+    parser.add_argument('--mode', choices=['default', 'realtime', 'both'],
+                        default='default',
+                        help='send from the main thread, from a real-time '
+                             'thread (Linux only), or compare both '
+                             '(default: %(default)s)')
+    parser.add_argument('--cpu', type=int,
+                        help='CPU for the real-time thread (default: the '
+                             'last isolated CPU, or else the last CPU)')
+    parser.add_argument('--priority', type=int, default=50,
+                        help='SCHED_FIFO priority of the real-time thread '
+                             '(default: %(default)s)')
+    args = parser.parse_args()
+    if args.backend == 'serial' and args.port is None:
+        parser.error('the serial backend requires --port')
+    if round(args.start, 1) <= 0:
+        parser.error('--start must be at least 0.1')
+    if args.stop < args.start:
+        parser.error('--stop must not be smaller than --start')
+    if args.n_triggers < 1:
+        parser.error('--n-triggers must be at least 1')
+    if args.pulse_width < 0:
+        parser.error('--pulse-width must not be negative')
+    if args.settle < 0:
+        parser.error('--settle must not be negative')
+    if args.retries < 0:
+        parser.error('--retries must not be negative')
+    if args.factor <= 1:
+        parser.error('--factor must be larger than 1')
+    if args.mock_u3 and not args.backend.startswith('labjack'):
+        parser.error('--mock-u3 requires a labjack backend')
+    if args.mode != 'default':
+        if not hasattr(os, 'sched_setscheduler'):
+            parser.error('--mode {} is only available on Linux'
+                         .format(args.mode))
+        # Isolated CPUs are not in the affinity mask of the process, so
+        # check against all online CPUs and prefer an isolated one
+        try:
+            cpus = read_cpu_list('/sys/devices/system/cpu/online')
+            isolated = read_cpu_list('/sys/devices/system/cpu/isolated')
+        except OSError:
+            cpus = set(range(os.cpu_count()))
+            isolated = set()
+        if args.cpu is None:
+            args.cpu = max(isolated or cpus)
+        elif args.cpu not in cpus:
+            parser.error('--cpu must be one of the online CPUs: {}'
+                         .format(sorted(cpus)))
+    single_bit = BACKENDS[args.backend].n_bits == 1
+    if args.pattern is None:
+        args.pattern = 'constant' if single_bit else 'walking'
+    elif single_bit and args.pattern != 'constant':
+        parser.error('the {} backend only supports the constant pattern'
+                     .format(args.backend))
+    return args
+
+
+def test_rate(device, send, mode, rate, pattern, args):
+    """Send triggers at `rate` Hz and summarize the observed pulses.
+
+    Returns the summary and the sent triggers with their results.
+    """
+    sends = run_level(send, rate, args.n_triggers, pattern)
+    # Let the device process all queued triggers
+    wait_for_device(device, sends, args)
+    gc.collect()
+    pulses = [p for p in get_pulses(device) if p[0] >= sends[0][0]]
+    results = analyze(sends, pulses, args)
+    s = summarize(mode, rate, sends, results, args)
+    print('{mode:>8} {rate:8.1f} {achieved:8.1f} {sent:5d} {dropped:7d} '
+          '{merged:6d} {delayed:7d} {median:9.3f} {p99:8.3f} '
+          '{p999:9.3f} {max:8.3f}'.format(**s))
+    return s, sends, results
+
+
+def run_ramp(device, send, mode, pattern, args):
+    """Test all rates until one is not sustainable.
+
+    Returns the maximum sustainable rate, the latencies in ms of the
+    triggers per sustainable rate, and one row per trigger for the csv file.
+    """
+    max_rate = None
+    latencies = {}
+    rows = []
+    for rate in get_rates(args):
+        for attempt in range(args.retries + 1):
+            s, sends, results = test_rate(device, send, mode, rate, pattern,
+                                          args)
+            rows.extend((mode, rate, attempt, i, value, t_send, status,
+                         latency)
+                        for i, ((t_send, value), (status, latency))
+                        in enumerate(zip(sends, results)))
+            if s['sustainable']:
+                break
+        else:
+            break
+        max_rate = rate
+        latencies[rate] = [lat * 1000 for _, lat in results
+                           if lat is not None]
+    return max_rate, latencies, rows
+
+
+def main():
+    args = parse_args()
+    if args.mode != 'default':
+        # Keep this process, its threads, and the emulator off the CPU of
+        # the real-time sender. In "both" mode this also applies to the
+        # default mode, so that both modes run on the same CPUs.
+        others = os.sched_getaffinity(0) - {args.cpu}
+        if others:
+            os.sched_setaffinity(0, others)
+        else:
+            warn('No CPU is left for the other threads, they share CPU {} '
+                 'with the real-time sender.'.format(args.cpu))
+    device = BACKENDS[args.backend](args)
+    pattern = PATTERNS[args.pattern]
+    modes = ['default', 'realtime'] if args.mode == 'both' else [args.mode]
+
+    print('{:>8} {:>8} {:>8} {:>5} {:>7} {:>6} {:>7} {:>9} {:>8} {:>9} {:>8}'
+          .format('mode', 'rate', 'achieved', 'sent', 'dropped', 'merged',
+                  'delayed', 'median ms', 'p99 ms', 'p99.9 ms', 'max ms'))
+    ramps = {}
+    rows = []
+    # Use the same switch interval in all modes, so that the comparison
+    # isolates the effect of the real-time sender
+    switchinterval = sys.getswitchinterval()
+    sys.setswitchinterval(SWITCH_INTERVAL)
+    try:
+        for mode in modes:
+            sender = None
+            send = device.send
+            if mode == 'realtime':
+                sender = RealtimeSender(device, args.cpu, args.priority)
+                sender.start()
+                send = sender.send
+            try:
+                max_rate, latencies, mode_rows = run_ramp(
+                    device, send, mode, pattern, args)
+            finally:
+                if sender is not None:
+                    sender.close()
+            ramps[mode] = (max_rate, latencies)
+            rows.extend(mode_rows)
+    finally:
+        sys.setswitchinterval(switchinterval)
+        device.close()
+
+    for mode, (max_rate, _) in ramps.items():
+        if max_rate is None:
+            print('{}: no sustainable rate found, decrease --start.'
+                  .format(mode))
+        else:
+            print('{}: maximum sustainable rate: {} Hz'.format(mode, max_rate))
+
+    # Compare the latencies on the rates that all modes could sustain
+    rates = set.intersection(*(set(lat) for _, lat in ramps.values()))
+    if rates:
+        print('Latency at rates up to {} Hz:'.format(max(rates)))
+        for mode, (_, latencies) in ramps.items():
+            pooled = [lat for rate in rates for lat in latencies[rate]]
+            print('{}: median {:.3f} ms, p99 {:.3f} ms, p99.9 {:.3f} ms'
+                  .format(mode, percentile(pooled, 50),
+                          percentile(pooled, 99), percentile(pooled, 99.9)))
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as fout:
+            writer = csv.writer(fout)
+            writer.writerow(['mode', 'rate', 'attempt', 'index', 'value',
+                             't_send', 'status', 'latency'])
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()